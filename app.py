@@ -1,55 +1,173 @@
 import os
 import re
 import io
-from flask import Flask, render_template, request, jsonify, send_file
+import hashlib
+import shutil
+import threading
+import uuid
+import multiprocessing
+from collections import OrderedDict
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import Flask, Response, render_template, request, jsonify, send_file, g
+import orjson
 import PyPDF2
-import pandas as pd
+import pypdfium2 as pdfium
+import numpy as np
+import xlsxwriter
 from datetime import datetime
 from werkzeug.utils import secure_filename
 
+# google-re2 matches the per-line patterns in linear time; fall back to re without it
+try:
+    import re2 as line_re
+except ImportError:
+    line_re = re
+
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['SAVE_UPLOADS'] = False  # Keep a copy of uploaded PDFs in UPLOAD_FOLDER
 
 # Ensure upload folder exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Precompiled regex patterns used by InvoiceExtractor
+_DATE_RE = re.compile(r'(\d{2}-\d{2}-\d{4})')
+_REF_RE = re.compile(r'INV(\d+)')
+_TOTAL_EXCL_RE = re.compile(r'Total \(Excl\)\s+([\d,]+\.?\d*)')
+_TOTAL_INCL_RE = re.compile(r'Total \(Incl\)\s+([\d,]+\.?\d*)')
+
+# Line item patterns (tier order is defined by _LINE_TIERS below)
+_LEGACY_FUEL_RE = line_re.compile(r'([A-Z\s:]+)\s+([\d,]+\.?\d*)\s+([\d,]+\.?\d*)\s+([\d,]+\.?\d*)')
+
+# The anchored tiers, in order. Each pattern is written once: it is compiled on
+# its own (for the later-tier fallback) and also merged into _LINE_RE below.
+# Group names carry a per-tier prefix so they stay unique in the alternation.
+_LINE_TIER_PATTERNS = (
+    ('general', r'^(?P<g_code>\S+)\s+(?P<g_desc>.+?)\s+(?P<g_qty>[\d,]+\.?\d*)\s+(?P<g_price>[\d,]+\.?\d*)\s+(?P<g_tax>[\d,]+\.?\d*)\s+(?P<g_total>[\d,]+\.?\d*)$'),
+    ('express_fuel', r'^(?P<ef_code>[A-Z]+\s*:\s*EL)\s+(?P<ef_desc>[A-Z\s:]+)\s+(?P<ef_qty>[\d,]+\.?\d*)\s+(?P<ef_price>[\d,]+\.?\d*)\s+(?P<ef_total>[\d,]+\.?\d*)$'),
+    ('express_alt', r'^(?P<ea_code>[A-Z]+\s*:\s*E[L]?)\s+(?P<ea_numbers>[A-Z0-9,]+)\s+(?P<ea_qty>[\d,]+\.?\d*)\s+(?P<ea_price>[\d,]+\.?\d*)\s+(?P<ea_total>[\d,]+\.?\d*)$'),
+)
+
+# The three anchored tiers merged into one alternation so each line is scanned
+# once. Alternatives are tried in tier order; the outer named group tells us
+# which tier matched (match.lastgroup).
+_LINE_RE = line_re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern in _LINE_TIER_PATTERNS))
+
+def _compile_tier(name, pattern):
+    """(name, standalone pattern, group names in match order) for one tier"""
+    compiled = line_re.compile(pattern)
+    group_names = tuple(sorted(compiled.groupindex, key=compiled.groupindex.get))
+    return name, compiled, group_names
+
+# Tier order, with each tier's standalone pattern and its group names in _LINE_RE
+_LINE_TIERS = tuple(_compile_tier(name, pattern) for name, pattern in _LINE_TIER_PATTERNS)
+_LINE_TIER_INDEX = {name: i for i, (name, _, _) in enumerate(_LINE_TIERS)}
+
+# RE2's \s only covers ASCII whitespace, so when RE2 is in use, map the other
+# characters Python's re treats as \s (e.g. the non-breaking spaces PDFs like to
+# emit) to plain spaces
+_UNICODE_SPACES = str.maketrans(dict.fromkeys(
+    '\v\x1c\x1d\x1e\x1f\x85\xa0\u1680\u2000\u2001\u2002\u2003\u2004\u2005'
+    '\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000',
+    ' '
+))
+
+# Cheap pre-filter: every tier needs at least three numbers, so only lines with a
+# digit are pulled out of the text; lines without one never become strings. The
+# shortest line any tier can accept is a legacy line such as "EL 1 1 1".
+_DIGIT_LINE_RE = re.compile(r'^[^\n]*\d[^\n]*', re.MULTILINE)
+_MIN_LINE_LENGTH = 8
+
+# Fuel product keywords for the legacy tier. Plain substrings, as before: "EL" also
+# matches inside words such as FUEL. The legacy capture is [A-Z\s:]+, so no case folding.
+_FUEL_KEYWORDS_RE = re.compile(r'DIESEL|PETROL|PARAFFIN|EL')
+
+# Below this many lines per tier, NumPy set-up costs more than per-line validation
+_MIN_BATCH_ROWS = 8
+
+# Number of parsed invoices remembered across uploads, keyed by file content
+_PARSE_CACHE_SIZE = 256
+
+# Excel column names for the (up to 3) line items exported per invoice, and the
+# item fields that fill them (in the same order)
+_ITEM_FIELDS = ('item_code', 'description', 'quantity', 'unit', 'price', 'tax', 'total')
+_item_values = itemgetter(*_ITEM_FIELDS)
+_EMPTY_ITEM_VALUES = ('',) * len(_ITEM_FIELDS)
+_ITEM_HEADERS = [
+    (f'Item {i+1} Code', f'Item {i+1} Description', f'Item {i+1} Quantity', f'Item {i+1} Unit',
+     f'Item {i+1} Price (Ex)', f'Item {i+1} Tax', f'Item {i+1} Total Rand')
+    for i in range(3)
+]
+_EXCEL_COLUMNS = (
+    ['Filename', 'Date', 'Our Reference', 'Total Expected', 'Total (Incl)']
+    + [header for headers in _ITEM_HEADERS for header in headers]
+)
+
+def _to_float(value):
+    """Convert a captured amount such as 20,049.00, dropping thousands separators"""
+    if ',' in value:
+        value = value.replace(',', '')
+    return float(value)
+
 class InvoiceExtractor:
     def __init__(self):
         self.extracted_data = []
+        self._excel_rows = None
+        self._excel_source = None
+        self._excel_len = 0
+        self._parse_cache = OrderedDict()
+    
+    def clear(self):
+        """Drop extracted data and any cached Excel rows"""
+        self.extracted_data = []
+        self._excel_rows = None
+        self._excel_source = None
+        self._excel_len = 0
     
-    def extract_text_from_pdf(self, pdf_path):
-        """Extract text from PDF file"""
+    def extract_text_from_pdf(self, data, filename):
+        """Extract text from PDF bytes (PDFium, falling back to PyPDF2)"""
         try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text()
-                return text
+            return self._extract_text_pdfium(data)
         except Exception as e:
-            print(f"Error reading PDF {pdf_path}: {str(e)}")
+            print(f"PDFium could not read PDF {filename}, falling back to PyPDF2: {str(e)}")
+        
+        try:
+            return self._extract_text_pypdf2(data)
+        except Exception as e:
+            print(f"Error reading PDF {filename}: {str(e)}")
             return ""
     
+    def _extract_text_pdfium(self, data):
+        pdf = pdfium.PdfDocument(data)
+        try:
+            return "\n".join(page.get_textpage().get_text_bounded() for page in pdf)
+        finally:
+            pdf.close()
+    
+    def _extract_text_pypdf2(self, data):
+        pdf_reader = PyPDF2.PdfReader(io.BytesIO(data))
+        text = ""
+        for page in pdf_reader.pages:
+            text += page.extract_text()
+        return text
+    
     def parse_invoice_data(self, text, filename):
         """Parse invoice data from extracted text"""
         try:
             # Extract date
-            date_pattern = r'(\d{2}-\d{2}-\d{4})'
-            date_match = re.search(date_pattern, text)
+            date_match = _DATE_RE.search(text)
             date = date_match.group(1) if date_match else ""
             
             # Extract Our Reference
-            ref_pattern = r'INV(\d+)'
-            ref_match = re.search(ref_pattern, text)
+            ref_match = _REF_RE.search(text)
             our_reference = f"INV{ref_match.group(1)}" if ref_match else ""
             
             # Extract Total (Excl) and Total (Incl)
-            total_excl_pattern = r'Total \(Excl\)\s+([\d,]+\.?\d*)'
-            total_incl_pattern = r'Total \(Incl\)\s+([\d,]+\.?\d*)'
-            
-            total_excl_match = re.search(total_excl_pattern, text)
-            total_incl_match = re.search(total_incl_pattern, text)
+            total_excl_match = _TOTAL_EXCL_RE.search(text)
+            total_incl_match = _TOTAL_INCL_RE.search(text)
             
             total_excl = float(total_excl_match.group(1).replace(',', '')) if total_excl_match else 0
             total_incl = float(total_incl_match.group(1).replace(',', '')) if total_incl_match else 0
@@ -57,6 +175,10 @@ class InvoiceExtractor:
             # Extract line items
             items = self.extract_line_items(text)
             
+            # Calculate total expected from all line items once, for the Excel rows and /debug
+            # Use the extracted total values which are already validated
+            total_expected = sum(item['total'] + item['tax'] for item in items)
+            
             # Create invoice record
             invoice_data = {
                 'filename': filename,
@@ -64,6 +186,7 @@ class InvoiceExtractor:
                 'our_reference': our_reference,
                 'total_excl': total_excl,
                 'total_incl': total_incl,
+                'total_expected': total_expected,
                 'items': items
             }
             
@@ -75,208 +198,415 @@ class InvoiceExtractor:
     
     def extract_line_items(self, text):
         """Extract line items from invoice text"""
-        items = []
+        if line_re is not re:
+            text = text.translate(_UNICODE_SPACES)
         
-        # Split text into lines for more precise parsing
-        lines = text.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            if not line or 'Item Code' in line or 'Item Description' in line:
+        # Walk the lines containing digits; headers and text-only lines are skipped
+        # by the regex engine without being split out
+        lines = []
+        for line_match in _DIGIT_LINE_RE.finditer(text):
+            line = line_match.group().strip()
+            if len(line) < _MIN_LINE_LENGTH or 'Item Code' in line or 'Item Description' in line:
                 continue
             
+            lines.append(line)
+        
+        # One combined scan per line, then validate each tier's matches as a NumPy batch
+        matches = [_LINE_RE.match(line) for line in lines]
+        batched = {}
+        for name, _, group_names in _LINE_TIERS:
+            rows = [i for i, match in enumerate(matches) if match and match.lastgroup == name]
+            if len(rows) >= _MIN_BATCH_ROWS:
+                batched.update(self._parse_tier_batch(name, group_names, rows, matches))
+        
+        items = []
+        for i, line in enumerate(lines):
+            if i in batched:
+                # Rejected by its first tier - later tiers may still accept the line
+                item = batched[i] or self._parse_later_tiers(line, _LINE_TIER_INDEX[matches[i].lastgroup])
+            else:
+                item = self._parse_matched_line(line, matches[i])
+            
+            if item:
+                items.append(item)
+        
+        return items
+    
+    def _parse_matched_line(self, line, match):
+        """Parse one line given its _LINE_RE match (or None), trying tiers in order"""
+        if not match:
+            return self._parse_later_tiers(line, len(_LINE_TIERS))
+        
+        # One scan tells us the first anchored tier that matches the line
+        first = _LINE_TIER_INDEX[match.lastgroup]
+        name, _, group_names = _LINE_TIERS[first]
+        return self._parse_tier(name, match.group(*group_names)) or self._parse_later_tiers(line, first)
+    
+    def _parse_later_tiers(self, line, first):
+        """Try the anchored tiers after index `first`, then the legacy fallback"""
+        # Those are the Express tiers, whose item codes always contain a colon
+        if ':' in line:
+            for name, pattern, _ in _LINE_TIERS[first + 1:]:
+                tier_match = pattern.match(line)
+                if tier_match:
+                    item = self._parse_tier(name, tier_match.groups())
+                    if item:
+                        return item
+        
+        # Pattern 3: Legacy fuel patterns (fallback for other formats)
+        legacy_match = _LEGACY_FUEL_RE.search(line)
+        if legacy_match:
+            return self._parse_legacy_fuel(legacy_match.groups())
+        
+        return None
+    
+    def _parse_tier(self, name, groups):
+        """Convert, validate and build the line item for an anchored tier match"""
+        if name == 'general':
+            # Unparseable amounts just mean the general format does not apply
+            try:
+                values = [_to_float(group) for group in groups[2:]]
+            except ValueError:
+                return None
+        else:
+            values = [_to_float(group) for group in groups[2:]]
+        
+        if self._tier_accepts(name, values[0], values[1], values[-1]):
+            return self._build_tier_item(name, groups, values)
+        return None
+    
+    def _parse_tier_batch(self, name, group_names, rows, matches):
+        """Vectorised _parse_tier over many lines; maps row index -> item or None"""
+        groups = [matches[i].group(*group_names) for i in rows]
+        try:
+            values = np.char.replace(np.array([g[2:] for g in groups]), ',', '').astype(np.float64)
+        except ValueError:
+            # An unparseable amount - leave these lines to the per-line path
+            return {}
+        
+        accepted = self._tier_batch_accepts(name, values)
+        return {
+            i: self._build_tier_item(name, g, v) if ok else None
+            for i, g, v, ok in zip(rows, groups, values.tolist(), accepted.tolist())
+        }
+    
+    def _tier_accepts(self, name, qty, price, total):
+        if name == 'general':
+            # Validation: check if calculations make sense for quantity * price ≈ total
+            expected_total = qty * price
+            return abs(total - expected_total) < expected_total * 0.1  # Within 10%
+        
+        # Express: quantity * price should equal total
+        calculated_total = qty * price
+        return abs(calculated_total - total) < max(total * 0.01, 0.01)  # Within 1% or 1 cent
+    
+    def _tier_batch_accepts(self, name, values):
+        """_tier_accepts over an array of (quantity, price, [tax,] total) rows"""
+        qty, price, total = values[:, 0], values[:, 1], values[:, -1]
+        expected_total = qty * price
+        if name == 'general':
+            return np.abs(total - expected_total) < expected_total * 0.1
+        return np.abs(expected_total - total) < np.maximum(total * 0.01, 0.01)
+    
+    def _build_tier_item(self, name, groups, values):
+        if name == 'general':
             # Pattern 1: General format with potential Tax column
             # Tries to match: Code Description Quantity [Unit] Price Tax Total
-            general_pattern = r'^(\S+)\s+(.+?)\s+([\d,]+\.?\d*)\s+([\d,]+\.?\d*)\s+([\d,]+\.?\d*)\s+([\d,]+\.?\d*)$'
-            match = re.match(general_pattern, line)
-            
-            if match and len(match.groups()) == 6:
-                try:
-                    code = match.group(1)
-                    desc = match.group(2).strip()
-                    qty = float(match.group(3).replace(',', ''))
-                    price = float(match.group(4).replace(',', ''))
-                    tax = float(match.group(5).replace(',', ''))
-                    total = float(match.group(6).replace(',', ''))
-                    
-                    # Validation: check if calculations make sense for quantity * price ≈ total
-                    expected_total = qty * price
-                    if abs(total - expected_total) < expected_total * 0.1:  # Within 10%
-                        items.append({
-                            'item_code': code,
-                            'description': desc,
-                            'quantity': qty,
-                            'unit': '',
-                            'price': price,
-                            'tax': tax,
-                            'total': total
-                        })
-                        continue
-                        
-                except ValueError:
-                    pass
-            
+            qty, price, tax, total = values
+            return {
+                'item_code': groups[0],
+                'description': groups[1].strip(),
+                'quantity': qty,
+                'unit': '',
+                'price': price,
+                'tax': tax,
+                'total': total
+            }
+        
+        item_code = groups[0].strip()
+        if name == 'express_fuel':
             # Pattern 2: Express Petroleum fuel patterns (verified format)
             # Format: "LSD : EL LOW SULPHUR DIESEL : EL 20,049.00 24.1264 483,710.19"
             # Structure: ItemCode Description Quantity Price Total
-            express_fuel_pattern = r'^([A-Z]+\s*:\s*EL)\s+([A-Z\s:]+)\s+([\d,]+\.?\d*)\s+([\d,]+\.?\d*)\s+([\d,]+\.?\d*)$'
-            express_match = re.match(express_fuel_pattern, line)
-            
-            if express_match:
-                item_code = express_match.group(1).strip()
-                description = express_match.group(2).strip()
-                quantity = float(express_match.group(3).replace(',', ''))
-                price = float(express_match.group(4).replace(',', ''))
-                total = float(express_match.group(5).replace(',', ''))
-                
-                # Verify calculation: quantity * price should equal total
-                calculated_total = quantity * price
-                if abs(calculated_total - total) < max(total * 0.01, 0.01):  # Within 1% or 1 cent
-                    items.append({
-                        'item_code': item_code,
-                        'description': description,
-                        'quantity': quantity,
-                        'unit': '',
-                        'price': price,
-                        'tax': 0.0,
-                        'total': total
-                    })
-                    continue
-            
+            description = groups[1].strip()
+        else:
             # Pattern 2b: Express Petroleum alternate format (with item numbers)
             # Format: "LSD : EL 84215 14,874.00 23.7297 352,955.56" or "PETROL : E 84217,84216 20,324.00 20.6990 420,686.48"
             # Structure: ItemCode ItemNumbers Quantity Price Total
-            express_alt_pattern = r'^([A-Z]+\s*:\s*E[L]?)\s+([A-Z0-9,]+)\s+([\d,]+\.?\d*)\s+([\d,]+\.?\d*)\s+([\d,]+\.?\d*)$'
-            express_alt_match = re.match(express_alt_pattern, line)
-            
-            if express_alt_match:
-                item_code = express_alt_match.group(1).strip()
-                item_numbers = express_alt_match.group(2).strip()
-                quantity = float(express_alt_match.group(3).replace(',', ''))
-                price = float(express_alt_match.group(4).replace(',', ''))
-                total = float(express_alt_match.group(5).replace(',', ''))
-                
-                # Create description from item code
-                if 'LSD' in item_code:
-                    description = 'LOW SULPHUR DIESEL : EL'
-                elif 'PETROL' in item_code:
-                    description = 'PETROL : EL'
-                else:
-                    description = item_code
-                
-                # Verify calculation: quantity * price should equal total
-                calculated_total = quantity * price
-                if abs(calculated_total - total) < max(total * 0.01, 0.01):  # Within 1% or 1 cent
-                    items.append({
-                        'item_code': item_code,
-                        'description': description,
-                        'quantity': quantity,
-                        'unit': '',
-                        'price': price,
-                        'tax': 0.0,
-                        'total': total
-                    })
-                    continue
-            
-            # Pattern 3: Legacy fuel patterns (fallback for other formats)
-            legacy_fuel_pattern = r'([A-Z\s:]+)\s+([\d,]+\.?\d*)\s+([\d,]+\.?\d*)\s+([\d,]+\.?\d*)'
-            legacy_match = re.search(legacy_fuel_pattern, line)
-            
-            if legacy_match:
-                desc = legacy_match.group(1).strip()
-                val1 = float(legacy_match.group(2).replace(',', ''))
-                val2 = float(legacy_match.group(3).replace(',', ''))
-                val3 = float(legacy_match.group(4).replace(',', ''))
-                
-                # Check if this looks like fuel product
-                if any(fuel in desc.upper() for fuel in ['DIESEL', 'PETROL', 'PARAFFIN', 'EL']):
-                    # Try to identify which is quantity, price, total by checking calculations
-                    # Usually: val1=quantity, val2=price, val3=total
-                    if abs(val3 - (val1 * val2)) < val3 * 0.01:  # val3 = val1 * val2 (within 1%)
-                        qty, price, total = val1, val2, val3
-                    # Sometimes: val1=total, val2=quantity, val3=price  
-                    elif abs(val1 - (val2 * val3)) < val1 * 0.01:  # val1 = val2 * val3
-                        qty, price, total = val2, val3, val1
-                    # Or: val1=quantity, val2=total, val3=price
-                    elif abs(val2 - (val1 * val3)) < val2 * 0.01:  # val2 = val1 * val3
-                        qty, price, total = val1, val3, val2
-                    else:
-                        # Default assumption: quantity, price, total
-                        qty, price, total = val1, val2, val3
-                    
-                    items.append({
-                        'item_code': '',
-                        'description': desc,
-                        'quantity': qty,
-                        'unit': '',
-                        'price': price,
-                        'tax': 0.0,
-                        'total': total
-                    })
-                    continue
+            # Create description from item code
+            if 'LSD' in item_code:
+                description = 'LOW SULPHUR DIESEL : EL'
+            elif 'PETROL' in item_code:
+                description = 'PETROL : EL'
+            else:
+                description = item_code
         
-        return items
+        quantity, price, total = values
+        return {
+            'item_code': item_code,
+            'description': description,
+            'quantity': quantity,
+            'unit': '',
+            'price': price,
+            'tax': 0.0,
+            'total': total
+        }
+    
+    def _parse_legacy_fuel(self, groups):
+        # Pattern 3: Legacy fuel patterns (fallback for other formats)
+        desc = groups[0].strip()
+        val1 = _to_float(groups[1])
+        val2 = _to_float(groups[2])
+        val3 = _to_float(groups[3])
+        
+        # Check if this looks like fuel product
+        if not _FUEL_KEYWORDS_RE.search(desc):
+            return None
+        
+        # Try to identify which is quantity, price, total by checking calculations
+        # Usually: val1=quantity, val2=price, val3=total
+        if abs(val3 - (val1 * val2)) < val3 * 0.01:  # val3 = val1 * val2 (within 1%)
+            qty, price, total = val1, val2, val3
+        # Sometimes: val1=total, val2=quantity, val3=price  
+        elif abs(val1 - (val2 * val3)) < val1 * 0.01:  # val1 = val2 * val3
+            qty, price, total = val2, val3, val1
+        # Or: val1=quantity, val2=total, val3=price
+        elif abs(val2 - (val1 * val3)) < val2 * 0.01:  # val2 = val1 * val3
+            qty, price, total = val1, val3, val2
+        else:
+            # Default assumption: quantity, price, total
+            qty, price, total = val1, val2, val3
+        
+        return {
+            'item_code': '',
+            'description': desc,
+            'quantity': qty,
+            'unit': '',
+            'price': price,
+            'tax': 0.0,
+            'total': total
+        }
     
     def process_folder(self, folder_path):
         """Process all PDF files in a folder"""
-        self.extracted_data = []
-        
+        pdf_files = []
         for filename in os.listdir(folder_path):
             if filename.lower().endswith('.pdf'):
-                pdf_path = os.path.join(folder_path, filename)
-                text = self.extract_text_from_pdf(pdf_path)
-                
-                if text:
-                    invoice_data = self.parse_invoice_data(text, filename)
-                    if invoice_data:
-                        self.extracted_data.append(invoice_data)
+                try:
+                    with open(os.path.join(folder_path, filename), 'rb') as file:
+                        pdf_files.append((filename, file.read()))
+                except OSError as e:
+                    print(f"Error reading PDF {filename}: {str(e)}")
+        
+        return self.process_files(pdf_files)
+    
+    def process_files(self, pdf_files):
+        """Process (filename, PDF bytes) pairs, e.g. straight from an upload"""
+        self.clear()
+        
+        # Re-uploaded files are served from the parse cache; only new content is parsed
+        keys = [self._file_key(data) for _, data in pdf_files]
+        
+        # Snapshot the hits before any new entry is remembered: storing a miss can
+        # evict an entry that a later file in this batch would otherwise read
+        hits = {}
+        for i, key in enumerate(keys):
+            if key in self._parse_cache:
+                self._parse_cache.move_to_end(key)
+                hits[i] = self._parse_cache[key]
+        
+        misses = [i for i in range(len(pdf_files)) if i not in hits]
+        parsed = dict(zip(misses, self._parse_pdfs([pdf_files[i] for i in misses])))
+        
+        for i, ((filename, _), key) in enumerate(zip(pdf_files, keys)):
+            if i in hits:
+                invoice_data = dict(hits[i], filename=filename)
+            else:
+                invoice_data = parsed[i]
+                if invoice_data:
+                    self._remember(key, invoice_data)
+            
+            if invoice_data:
+                self.extracted_data.append(invoice_data)
         
         return self.extracted_data
     
+    def _parse_pdfs(self, pdf_files):
+        # PDFs are independent, so spread them over the shared worker pool.
+        # PDFium is not thread-safe, so even a single file goes to a worker
+        # rather than running in the request thread.
+        pool = _get_pdf_pool()
+        futures = [pool.submit(_process_one_pdf, filename, data) for filename, data in pdf_files]
+        results = []
+        for (filename, data), future in zip(pdf_files, futures):
+            try:
+                results.append(future.result())
+            except BrokenProcessPool:
+                # A worker died (e.g. PDFium crashed), taking every pending file
+                # in the pool with it. Retry each one alone so only the culprit is lost.
+                _discard_pdf_pool(pool)
+                results.append(_process_one_pdf_alone(filename, data))
+        return results
+    
+    def _file_key(self, data):
+        """Content hash used as the parse cache key"""
+        return hashlib.blake2b(data, digest_size=16).digest()
+    
+    def _remember(self, key, invoice_data):
+        self._parse_cache[key] = invoice_data
+        if len(self._parse_cache) > _PARSE_CACHE_SIZE:
+            self._parse_cache.popitem(last=False)
+    
     def convert_to_excel_format(self):
         """Convert extracted data to Excel-ready format"""
+        return self.excel_rows
+    
+    @property
+    def excel_rows(self):
+        """Excel-ready rows, rebuilt only when extracted_data changes"""
+        # /results, /download, /api/data and repeat visits all ask for the same rows.
+        # Keep a reference to the source list (not just its id), so a replacement
+        # list can never be mistaken for the one the rows were built from.
+        # The length is read once and the rows built from that many invoices, so an
+        # append mid-build cannot leave the cache marked as covering it.
+        data = self.extracted_data
+        n = len(data)
+        if data is not self._excel_source or n != self._excel_len:
+            self._excel_rows = self._build_excel_rows(data[:n])
+            self._excel_source = data
+            self._excel_len = n
+        return self._excel_rows
+    
+    def _build_excel_rows(self, invoices):
         excel_data = []
         
-        for invoice in self.extracted_data:
-            # Calculate total expected from all line items
-            # Use the extracted total values which are already validated
-            total_expected = sum(item['total'] + item.get('tax', 0) for item in invoice['items'])
-            
+        for invoice in invoices:
             # Create base row with invoice info
             row = {
                 'Filename': invoice['filename'],
                 'Date': invoice['date'],
                 'Our Reference': invoice['our_reference'],
-                'Total Expected': total_expected,
+                'Total Expected': invoice['total_expected'],
                 'Total (Incl)': invoice['total_incl']
             }
             
-            # Add up to 3 items (can be extended)
-            for i in range(3):
-                if i < len(invoice['items']):
-                    item = invoice['items'][i]
-                    row[f'Item {i+1} Code'] = item.get('item_code', '')
-                    row[f'Item {i+1} Description'] = item['description']
-                    row[f'Item {i+1} Quantity'] = item['quantity']
-                    row[f'Item {i+1} Unit'] = item.get('unit', '')
-                    row[f'Item {i+1} Price (Ex)'] = item['price']
-                    row[f'Item {i+1} Tax'] = item.get('tax', 0)
-                    row[f'Item {i+1} Total Rand'] = item['total']
-                else:
-                    row[f'Item {i+1} Code'] = ''
-                    row[f'Item {i+1} Description'] = ''
-                    row[f'Item {i+1} Quantity'] = ''
-                    row[f'Item {i+1} Unit'] = ''
-                    row[f'Item {i+1} Price (Ex)'] = ''
-                    row[f'Item {i+1} Tax'] = ''
-                    row[f'Item {i+1} Total Rand'] = ''
+            # Add up to 3 items (can be extended via _ITEM_HEADERS)
+            items = invoice['items']
+            for i, headers in enumerate(_ITEM_HEADERS):
+                values = _item_values(items[i]) if i < len(items) else _EMPTY_ITEM_VALUES
+                row.update(zip(headers, values))
             
             excel_data.append(row)
         
         return excel_data
 
-# Global extractor instance
-extractor = InvoiceExtractor()
+def _process_one_pdf(filename, data):
+    """Extract and parse a single PDF (runs in a worker process)"""
+    # A fresh extractor keeps the worker from pickling the caller's extracted_data
+    worker = InvoiceExtractor()
+    text = worker.extract_text_from_pdf(data, filename)
+    
+    if not text:
+        return None
+    return worker.parse_invoice_data(text, filename)
+
+# Worker pool shared by all requests. It is created on first use with a
+# forkserver/spawn context (forking a threaded server can deadlock) and capped
+# in size, since every server worker process gets its own pool.
+_PDF_POOL_MAX_WORKERS = min(4, os.cpu_count() or 1)
+_PDF_POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+def _get_pdf_pool():
+    """Return the shared worker pool, creating it if needed"""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=_PDF_POOL_MAX_WORKERS,
+                mp_context=multiprocessing.get_context(_PDF_POOL_START_METHOD),
+            )
+        return _pdf_pool
+
+def _discard_pdf_pool(pool):
+    """Drop a broken pool so the next call starts a fresh one"""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is pool:
+            _pdf_pool = None
+    pool.shutdown(wait=False)
+
+def _process_one_pdf_alone(filename, data):
+    """Parse one PDF on its own in the pool, returning None if its worker dies"""
+    pool = _get_pdf_pool()
+    try:
+        return pool.submit(_process_one_pdf, filename, data).result()
+    except BrokenProcessPool:
+        print(f"Worker crashed while processing {filename}")
+        _discard_pdf_pool(pool)
+        return None
+
+# One extractor per browser session, so concurrent users don't clobber each other's
+# results. Sessions are identified by a random cookie and the oldest are evicted.
+SESSION_COOKIE = 'invoice_session'
+_MAX_SESSIONS = 64
+_SESSION_ID_RE = re.compile(r'[0-9a-f]{32}')
+_extractors = OrderedDict()
+_extractors_lock = threading.Lock()
+
+def get_extractor(create=False):
+    """Return the InvoiceExtractor for the current request's session
+    
+    Only /upload passes create=True. Read-only routes without a known session get
+    an empty extractor that is never registered, so they can't evict real sessions.
+    """
+    if 'extractor' not in g:
+        session_id = request.cookies.get(SESSION_COOKIE, '')
+        valid = _SESSION_ID_RE.fullmatch(session_id)
+        
+        with _extractors_lock:
+            extractor = _extractors.get(session_id) if valid else None
+            if extractor is not None:
+                _extractors.move_to_end(session_id)
+            elif create:
+                if not valid:
+                    session_id = uuid.uuid4().hex
+                    g.new_session_id = session_id
+                extractor = InvoiceExtractor()
+                _extractors[session_id] = extractor
+                if len(_extractors) > _MAX_SESSIONS:
+                    evicted_id, _ = _extractors.popitem(last=False)
+                    shutil.rmtree(session_upload_folder(evicted_id), ignore_errors=True)
+        
+        if extractor is None:
+            extractor = InvoiceExtractor()
+            session_id = None
+        
+        g.session_id = session_id
+        g.extractor = extractor
+    return g.extractor
+
+def session_upload_folder(session_id):
+    """Upload directory for a single session"""
+    return os.path.join(app.config['UPLOAD_FOLDER'], session_id)
+
+def save_uploads(pdf_files):
+    """Replace this session's upload folder contents with the given PDFs"""
+    upload_folder = session_upload_folder(g.session_id)
+    shutil.rmtree(upload_folder, ignore_errors=True)
+    os.makedirs(upload_folder)
+    
+    for filename, data in pdf_files:
+        with open(os.path.join(upload_folder, filename), 'wb') as file:
+            file.write(data)
+
+@app.after_request
+def set_session_cookie(response):
+    """Hand newly created session ids back to the browser"""
+    if 'new_session_id' in g:
+        response.set_cookie(SESSION_COOKIE, g.new_session_id, httponly=True, samesite='Lax')
+    return response
 
 @app.route('/')
 def index():
@@ -291,27 +621,27 @@ def upload_files():
     
     files = request.files.getlist('files')
     uploaded_files = []
+    pdf_files = []
     
-    # Clear upload folder and previous extraction data
-    for file in os.listdir(app.config['UPLOAD_FOLDER']):
-        os.remove(os.path.join(app.config['UPLOAD_FOLDER'], file))
-    
-    # Clear previous extraction results
-    extractor.extracted_data = []
-    
-    # Save uploaded files
+    # Read uploaded files straight into memory
     for file in files:
         if file and file.filename.lower().endswith('.pdf'):
             filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
+            pdf_files.append((filename, file.stream.read()))
             uploaded_files.append(filename)
     
     if not uploaded_files:
         return jsonify({'error': 'No valid PDF files uploaded'}), 400
     
+    # Only a valid upload starts a session or replaces its previous results
+    extractor = get_extractor(create=True)
+    extractor.clear()
+    
+    if app.config['SAVE_UPLOADS']:
+        save_uploads(pdf_files)
+    
     # Process uploaded files
-    extracted_data = extractor.process_folder(app.config['UPLOAD_FOLDER'])
+    extracted_data = extractor.process_files(pdf_files)
     
     return jsonify({
         'success': True,
@@ -322,7 +652,7 @@ def upload_files():
 @app.route('/results')
 def results():
     """Display extracted data"""
-    excel_data = extractor.convert_to_excel_format()
+    excel_data = get_extractor().convert_to_excel_format()
     
     # Calculate summary stats
     total_invoices = len(excel_data)
@@ -340,18 +670,23 @@ def results():
 @app.route('/download')
 def download_excel():
     """Download extracted data as Excel file"""
-    excel_data = extractor.convert_to_excel_format()
+    excel_data = get_extractor().convert_to_excel_format()
     
     if not excel_data:
         return jsonify({'error': 'No data to download'}), 400
     
-    # Create DataFrame and Excel file
-    df = pd.DataFrame(excel_data)
-    
-    # Create Excel file in memory
+    # Create Excel file in memory. constant_memory flushes each row once the next one
+    # starts, so rows must be written in order - pandas' to_excel writes column by
+    # column, hence the sheet is written directly.
     output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Invoice Data')
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    worksheet = workbook.add_worksheet('Invoice Data')
+    header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+    
+    worksheet.write_row(0, 0, _EXCEL_COLUMNS, header_format)
+    for row_num, row in enumerate(excel_data, start=1):
+        worksheet.write_row(row_num, 0, [row[column] for column in _EXCEL_COLUMNS])
+    workbook.close()
     
     output.seek(0)
     
@@ -369,15 +704,17 @@ def download_excel():
 @app.route('/api/data')
 def get_data():
     """API endpoint to get extracted data as JSON"""
-    return jsonify(extractor.convert_to_excel_format())
+    # orjson serialises the rows much faster than jsonify; keys stay sorted as jsonify had them
+    body = orjson.dumps(get_extractor().convert_to_excel_format(), option=orjson.OPT_SORT_KEYS)
+    return Response(body, mimetype='application/json')
 
 @app.route('/debug')
 def debug_extraction():
     """Debug endpoint to show detailed extraction information"""
     debug_data = []
     
-    for invoice in extractor.extracted_data:
-        total_expected = sum(item['total'] + item.get('tax', 0) for item in invoice['items'])
+    for invoice in get_extractor().extracted_data:
+        total_expected = invoice['total_expected']
         discrepancy = abs(total_expected - invoice['total_incl'])
         
         debug_info = {
@@ -0,0 +1,42 @@
+import app
+
+# Ten lines whose first tier is general: six it accepts, two that fall through to
+# the legacy fuel pattern and two that Express alternate format accepts instead
+_GENERAL_LINES = (
+    [f'A{i} Widget {i} 10 5.00 7.50 50.00' for i in range(6)]
+    + [f'C{i} DIESEL DRUM 2 10.00 3.00 99.00' for i in range(2)]
+    + [f'LSD : EL 8421{i} 10 2 20' for i in range(2)]
+)
+
+# Eight lines whose first tier is Express fuel: six it accepts and two whose maths
+# is off, which only the legacy fuel pattern takes
+_EXPRESS_LINES = (
+    [f'LSD : EL LOW SULPHUR DIESEL : EL 1{i} 2.5 {25 + 2.5 * i:.2f}' for i in range(6)]
+    + [f'PETROL : EL UNLEADED {i + 200} 2 20' for i in range(2)]
+)
+
+_TEXT = '\n'.join(['Item Code Item Description Quantity Price Tax Total'] + _GENERAL_LINES + _EXPRESS_LINES)
+
+
+def test_batch_validation_matches_per_line(monkeypatch):
+    batched_tiers = []
+    parse_tier_batch = app.InvoiceExtractor._parse_tier_batch
+
+    def spy(self, name, *args):
+        batched_tiers.append(name)
+        return parse_tier_batch(self, name, *args)
+
+    monkeypatch.setattr(app.InvoiceExtractor, '_parse_tier_batch', spy)
+    batched = app.InvoiceExtractor().extract_line_items(_TEXT)
+    assert batched_tiers == ['general', 'express_fuel']
+
+    monkeypatch.setattr(app, '_MIN_BATCH_ROWS', 10 ** 9)
+    per_line = app.InvoiceExtractor().extract_line_items(_TEXT)
+
+    assert batched == per_line
+    assert len(batched) == len(_GENERAL_LINES) + len(_EXPRESS_LINES)
+    # Rejected by their first tier, then picked up by a later one
+    assert [item['description'] for item in batched if not item['item_code']] == (
+        ['DIESEL DRUM'] * 2 + ['PETROL : EL UNLEADED'] * 2
+    )
+    assert [item['description'] for item in batched if item['item_code'] == 'LSD : EL'].count('LOW SULPHUR DIESEL : EL') == 8
@@ -0,0 +1,43 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import app
+
+
+class _FakePool:
+    """Stands in for the worker pool; files named in `crash` break it"""
+
+    def __init__(self, crash):
+        self.crash = crash
+
+    def submit(self, fn, filename, data):
+        future = Future()
+        if filename in self.crash:
+            future.set_exception(BrokenProcessPool())
+        else:
+            future.set_result({'filename': filename, 'items': []})
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def test_unreadable_pdf_is_skipped():
+    assert app.InvoiceExtractor()._parse_pdfs([('bad.pdf', b'not a pdf')]) == [None]
+
+
+def test_crashed_worker_only_loses_its_own_file(monkeypatch):
+    """Files caught up in a broken pool are retried; only the one that crashes is dropped"""
+    # The batch pool breaks for every pending file; the retries then run one at a time
+    pools = iter([
+        _FakePool(crash={'b.pdf', 'crash.pdf', 'c.pdf'}),
+        _FakePool(crash=set()),
+        _FakePool(crash={'crash.pdf'}),
+        _FakePool(crash=set()),
+    ])
+    monkeypatch.setattr(app, '_get_pdf_pool', lambda: next(pools))
+
+    files = [('a.pdf', b'a'), ('b.pdf', b'b'), ('crash.pdf', b'x'), ('c.pdf', b'c')]
+    results = app.InvoiceExtractor()._parse_pdfs(files)
+
+    assert [r and r['filename'] for r in results] == ['a.pdf', 'b.pdf', None, 'c.pdf']
@@ -0,0 +1,21 @@
+import app
+
+
+def _fake_parse(filename, data):
+    return {'filename': filename, 'content': data, 'items': []}
+
+
+def test_cache_hit_survives_eviction_by_earlier_miss(monkeypatch):
+    """A re-uploaded file must not lose its cache entry to a new file in the same batch"""
+    monkeypatch.setattr(app, '_PARSE_CACHE_SIZE', 2)
+    monkeypatch.setattr(
+        app.InvoiceExtractor, '_parse_pdfs',
+        lambda self, pdf_files: [_fake_parse(filename, data) for filename, data in pdf_files]
+    )
+    extractor = app.InvoiceExtractor()
+    
+    extractor.process_files([('p0.pdf', b'p0')])
+    extractor.process_files([('p1.pdf', b'p1')])
+    results = extractor.process_files([('p2.pdf', b'p2'), ('again.pdf', b'p0')])
+    
+    assert [(r['filename'], r['content']) for r in results] == [('p2.pdf', b'p2'), ('again.pdf', b'p0')]
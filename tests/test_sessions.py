@@ -0,0 +1,52 @@
+import io
+
+import app
+
+
+def _fake_parse_pdfs(self, pdf_files):
+    return [
+        {'filename': filename, 'date': '', 'our_reference': '', 'total_excl': 0,
+         'total_incl': 0, 'total_expected': 0, 'items': []}
+        for filename, _ in pdf_files
+    ]
+
+
+def _upload(client, filename):
+    return client.post(
+        '/upload', data={'files': [(io.BytesIO(b'%PDF'), filename)]}, content_type='multipart/form-data'
+    )
+
+
+def test_read_routes_do_not_create_or_evict_sessions(monkeypatch):
+    """Cookieless GETs get an empty result and leave existing sessions alone"""
+    monkeypatch.setattr(app, '_extractors', app.OrderedDict())
+    monkeypatch.setattr(app.InvoiceExtractor, '_parse_pdfs', _fake_parse_pdfs)
+    user = app.app.test_client()
+    response = _upload(user, 'a.pdf')
+    assert response.status_code == 200
+    
+    for _ in range(app._MAX_SESSIONS + 1):
+        anonymous = app.app.test_client()
+        response = anonymous.get('/api/data')
+        assert response.get_json() == []
+        assert 'Set-Cookie' not in response.headers
+    
+    assert len(app._extractors) == 1
+    assert [row['Filename'] for row in user.get('/api/data').get_json()] == ['a.pdf']
+
+
+def test_rejected_upload_keeps_sessions_and_results(monkeypatch):
+    """An upload without PDFs creates no session and leaves earlier results in place"""
+    monkeypatch.setattr(app, '_extractors', app.OrderedDict())
+    monkeypatch.setattr(app.InvoiceExtractor, '_parse_pdfs', _fake_parse_pdfs)
+    user = app.app.test_client()
+    assert _upload(user, 'a.pdf').status_code == 200
+    
+    anonymous = app.app.test_client()
+    response = _upload(anonymous, 'notes.txt')
+    assert response.status_code == 400
+    assert 'Set-Cookie' not in response.headers
+    assert len(app._extractors) == 1
+    
+    assert _upload(user, 'notes.txt').status_code == 400
+    assert [row['Filename'] for row in user.get('/api/data').get_json()] == ['a.pdf']